@@ -2,15 +2,25 @@ import os
 import sys
 import sqlite3
 import hashlib
-import magic
+import mmap
 import logging
+import queue
+import threading
 from datetime import datetime
 from pathlib import Path
 from tqdm import tqdm
-from markitdown import MarkItDown
-from schema import init_database, get_supported_formats
+from markitdown import MarkItDown, UnsupportedFormatException
+from schema import (
+    init_database, create_indices, drop_indices, upgrade_database,
+    compress_content, decompress_content, get_supported_formats
+)
 import datetime as dt
 import warnings
+from collections import deque
+from contextlib import contextmanager, nullcontext
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Configure logging
 logging.basicConfig(
@@ -25,80 +35,234 @@ logging.basicConfig(
 # ファイルの先頭に追加
 warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl')
 
+# datetime型のアダプターを登録 (global registrations, done once at import)
+sqlite3.register_adapter(dt.datetime, lambda x: x.isoformat())
+sqlite3.register_converter("datetime", lambda x: dt.datetime.fromisoformat(x.decode()))
+
+# MarkItDown instance owned by each conversion worker process
+_worker_md = None
+
+def _init_converter():
+    """Create the MarkItDown instance once per worker process"""
+    global _worker_md
+    _worker_md = MarkItDown()
+
+def _converter_ready():
+    """Trivial task used to check that conversion workers can start"""
+    return _worker_md is not None
+
+def _convert(file_path):
+    """Convert a file in a worker process, returning (status, compressed markdown or error)"""
+    # Exceptions are flattened to strings so every result pickles back cleanly
+    try:
+        # Compressing here keeps the work off the single database writer
+        return 'processed', compress_content(_worker_md.convert(file_path).text_content)
+    except UnsupportedFormatException as e:
+        return 'skipped', str(e)
+    except Exception as e:
+        return 'failed', str(e)
+
 class FileIndexer:
-    def __init__(self, db_path='file_index.db'):
+    # Number of file rows written per transaction
+    BATCH_SIZE = 10000
+    # Files at least this large are hashed through mmap instead of read()
+    MMAP_THRESHOLD = 1 << 20
+    # Files queued per worker thread ahead of the database writer
+    PENDING_PER_WORKER = 4
+    # Threads listing directories concurrently during the tree walk
+    WALK_WORKERS = 8
+    # Tables whose secondary indices are rebuilt after an initial bulk load
+    BULK_LOAD_TABLES = ('files', 'directories')
+
+    # Statements are kept as constants so sqlite3's statement cache reuses them
+    # Upserts keep row ids stable (rows referencing files/directories stay valid)
+    # and the WHERE clauses skip the write entirely when nothing changed
+    _INSERT_FILE_SQL = '''
+        INSERT INTO files (
+            file_path, file_name, file_extension, file_size,
+            created_at, modified_at, indexed_at, checksum,
+            processing_status, error_message
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(file_path) DO UPDATE SET
+            file_name = excluded.file_name,
+            file_extension = excluded.file_extension,
+            file_size = excluded.file_size,
+            created_at = excluded.created_at,
+            modified_at = excluded.modified_at,
+            indexed_at = excluded.indexed_at,
+            checksum = excluded.checksum,
+            processing_status = excluded.processing_status,
+            error_message = excluded.error_message
+        WHERE files.checksum IS NOT excluded.checksum
+            OR files.modified_at IS NOT excluded.modified_at
+            OR files.file_size IS NOT excluded.file_size
+            OR files.processing_status IS NOT excluded.processing_status
+    '''
+    _INSERT_CONTENT_SQL = '''
+        INSERT INTO file_contents (file_id, content)
+        VALUES ((SELECT id FROM files WHERE file_path = ?), ?)
+        ON CONFLICT(file_id) DO UPDATE SET content = excluded.content
+        WHERE file_contents.content IS NOT excluded.content
+    '''
+    _INSERT_DIR_SQL = '''
+        INSERT INTO directories (
+            dir_path, dir_name, parent_dir_path, depth,
+            created_at, modified_at, indexed_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(dir_path) DO UPDATE SET
+            dir_name = excluded.dir_name,
+            parent_dir_path = excluded.parent_dir_path,
+            depth = excluded.depth,
+            created_at = excluded.created_at,
+            modified_at = excluded.modified_at,
+            indexed_at = excluded.indexed_at
+        WHERE directories.modified_at IS NOT excluded.modified_at
+            OR directories.parent_dir_path IS NOT excluded.parent_dir_path
+    '''
+
+    def __init__(self, db_path='file_index.db', always_hash_extensions=()):
         """Initialize the file indexer"""
         self.db_path = db_path
-        self.md = MarkItDown()
         if not Path(db_path).exists():
             init_database(db_path)
-        self.supported_formats = self._get_supported_formats()
+        self._file_batch = []
+        self._content_batch = []
+        self._dir_batch = []
+        self._known_files = {}
+        self._thread_local = threading.local()
+        # Conversion pool of the current run, replaced if a crashed worker breaks it
+        self._converter = None
+        self._converter_lock = threading.Lock()
+        # Single-worker pool converting files caught in a crash one at a time
+        self._isolation_pool = None
+        # Shared timestamp for every row in the current batch, refreshed on flush
+        self._indexed_at = dt.datetime.now().isoformat()
         
         self.conn = sqlite3.connect(
             db_path,
             detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
         )
-        # datetime型のアダプターを登録
-        sqlite3.register_adapter(dt.datetime, lambda x: x.isoformat())
-        sqlite3.register_converter("datetime", lambda x: dt.datetime.fromisoformat(x.decode()))
+        self._configure_connection()
+        # Databases created by older versions get new tables, indices and triggers on open
+        with self.conn:
+            upgrade_database(self.conn.cursor())
+
+        self.supported_formats = self._get_supported_formats()
+        # Checksums are only calculated for supported formats plus these extras
+        self.hashed_formats = self.supported_formats | frozenset(
+            ext.lower().lstrip('.') for ext in always_hash_extensions
+        )
         
+    def _configure_connection(self):
+        """Tune SQLite for bulk writes (WAL journal, relaxed sync, large cache)"""
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA temp_store=MEMORY')
+        self.conn.execute('PRAGMA cache_size=-262144')  # 256 MiB
+        self.conn.execute('PRAGMA mmap_size=268435456')
+        # Open the shared WAL index now; if the first read happens under
+        # locking_mode=EXCLUSIVE the lock is held until the connection closes
+        self.conn.execute('SELECT 1 FROM file_formats LIMIT 1').fetchall()
+
+    @contextmanager
+    def bulk_mode(self):
+        """Disable journaling, fsync and (on an empty database) secondary indices while loading"""
+        # Leaving WAL folds any pending frames back into the main database file
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.conn.execute('PRAGMA journal_mode=MEMORY')
+        self.conn.execute('PRAGMA synchronous=OFF')
+        # Building each index once after the load is cheaper than updating it per row,
+        # but only worth it (and only safe) while the loaded tables are still empty
+        rebuild_indices = self._is_empty_database()
+        if rebuild_indices:
+            with self.conn:
+                drop_indices(self.conn.cursor(), self.BULK_LOAD_TABLES)
+        try:
+            yield
+        finally:
+            if rebuild_indices:
+                with self.conn:
+                    create_indices(self.conn.cursor())
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.execute('SELECT 1 FROM file_formats LIMIT 1').fetchall()
+
+    def _is_empty_database(self):
+        """Return True when no files or directories have been indexed yet"""
+        # Directory docs, tags and relations all reference directories rows,
+        # so an empty directories table also means there is no hand-entered data
+        return not self.conn.execute('''
+            SELECT EXISTS(SELECT 1 FROM files) OR EXISTS(SELECT 1 FROM directories)
+        ''').fetchone()[0]
+
     def _get_supported_formats(self):
         """Get list of supported file extensions from database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         cursor.execute('SELECT extension FROM file_formats WHERE is_enabled = TRUE')
-        formats = {row[0] for row in cursor.fetchall()}
-        conn.close()
+        formats = frozenset(row[0] for row in cursor.fetchall())
         return formats
 
+    def _read_buffer(self):
+        """Return the calling thread's reusable checksum read buffer"""
+        buf = getattr(self._thread_local, 'read_buffer', None)
+        if buf is None:
+            buf = self._thread_local.read_buffer = memoryview(bytearray(self.MMAP_THRESHOLD))
+        return buf
+
     def _calculate_checksum(self, file_path):
         """Calculate MD5 checksum of a file"""
         try:
             hash_md5 = hashlib.md5()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
+            # Unbuffered: readinto() fills our buffer directly without an extra copy
+            with open(file_path, "rb", buffering=0) as f:
+                if os.fstat(f.fileno()).st_size < self.MMAP_THRESHOLD:
+                    buf = self._read_buffer()
+                    while (n := f.readinto(buf)):
+                        hash_md5.update(buf[:n])
+                else:
+                    # Hash the whole mapping in one call; hashlib releases the GIL
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        hash_md5.update(mm)
             return hash_md5.hexdigest()
         except Exception as e:
             logging.error(f"Error calculating checksum for {file_path}: {e}")
             return None
 
-    def _process_file(self, file_path):
-        """Process a single file and convert to markdown if supported"""
+    def _process_file(self, file_path, file_entry):
+        """Collect metadata and checksum for a single file (path and its os.DirEntry)"""
         try:
-            file_stat = os.stat(file_path)
-            file_ext = Path(file_path).suffix.lower().lstrip('.')
+            # DirEntry caches the stat result across calls
+            file_stat = file_entry.stat()
+            # Timestamps are stored as ISO strings, formatted here rather than by the adapter
+            modified_at = dt.datetime.fromtimestamp(file_stat.st_mtime).isoformat()
+
+            # Skip hashing and conversion when the file is unchanged since the last run
+            if self._known_files.get(file_path) == (modified_at, file_stat.st_size):
+                return {'file_path': file_path, 'processing_status': 'unchanged'}
+
+            file_ext = os.path.splitext(file_path)[1].lower().lstrip('.')
             
             # 基本的なファイル情報を収集
             file_info = {
-                'file_path': str(file_path),
-                'file_name': Path(file_path).name,
+                'file_path': file_path,
+                'file_name': file_entry.name,
                 'file_extension': file_ext,
                 'file_size': file_stat.st_size,
-                'created_at': dt.datetime.fromtimestamp(file_stat.st_ctime),
-                'modified_at': dt.datetime.fromtimestamp(file_stat.st_mtime),
-                'indexed_at': dt.datetime.now(),
-                'checksum': self._calculate_checksum(file_path),
+                'created_at': dt.datetime.fromtimestamp(file_stat.st_ctime).isoformat(),
+                'modified_at': modified_at,
+                'indexed_at': self._indexed_at,
+                'checksum': None,
                 'processing_status': 'skipped',
-                'markdown_content': None,
+                'compressed_content': None,
                 'error_message': None
             }
+
+            # Unsupported files are not read at all unless explicitly requested
+            if file_ext in self.hashed_formats:
+                file_info['checksum'] = self._calculate_checksum(file_path)
             
-            # サポートされている形式の場合のみ変換を試みる
-            if file_ext in self.supported_formats:
-                try:
-                    result = self.md.convert(str(file_path))
-                    file_info['markdown_content'] = result.text_content
-                    file_info['processing_status'] = 'processed'
-                except self.md.UnsupportedFormatException as e:
-                    file_info['processing_status'] = 'skipped'
-                    file_info['error_message'] = f"Unsupported format: {e}"
-                    logging.info(f"Skipping unsupported file: {file_path} - {e}")
-                except Exception as e:
-                    file_info['processing_status'] = 'failed'
-                    file_info['error_message'] = str(e)
-                    logging.warning(f"Error processing {file_path}: {e}")
-            else:
+            # サポートされていない形式は変換段階に回さない
+            if file_ext not in self.supported_formats:
                 file_info['processing_status'] = 'skipped'
                 file_info['error_message'] = f"Unsupported file format: .{file_ext}"
                 logging.debug(f"Skipping unsupported file: {file_path}")
@@ -109,79 +273,290 @@ class FileIndexer:
             logging.error(f"Error processing {file_path}: {e}")
             return None
 
-    def _save_to_db(self, file_info):
-        """Save file information to database"""
+    def _apply_conversion(self, file_info, outcome):
+        """Record the (status, content or error) result of _convert in file_info"""
+        status, value = outcome
+        file_path = file_info['file_path']
+        file_info['processing_status'] = status
+        if status == 'processed':
+            file_info['compressed_content'] = value
+        elif status == 'skipped':
+            file_info['error_message'] = f"Unsupported format: {value}"
+            logging.info(f"Skipping unsupported file: {file_path} - {value}")
+        else:
+            file_info['error_message'] = value
+            logging.warning(f"Error processing {file_path}: {value}")
+        return file_info
+
+    def _walk(self, root_path):
+        """Yield (path, DirEntry) for every file and directory under root_path (in no fixed order)"""
+        # Walker threads list sibling subtrees concurrently; scandir releases the GIL.
+        # Paths are joined here instead of using DirEntry.path so that an empty
+        # root (the current directory) yields 'a/x.txt' rather than './a/x.txt'.
+        dir_queue = queue.Queue()
+        entry_queue = queue.Queue()
+        done = object()
+
+        def scan_worker():
+            while True:
+                dir_path = dir_queue.get()
+                if dir_path is None:
+                    return
+                batch = []
+                try:
+                    with os.scandir(dir_path or os.curdir) as entries:
+                        for entry in entries:
+                            path = os.path.join(dir_path, entry.name)
+                            # DirEntry answers this from the directory listing, no extra stat
+                            if entry.is_dir(follow_symlinks=False):
+                                dir_queue.put(path)
+                            batch.append((path, entry))
+                except OSError as e:
+                    logging.warning(f"Error scanning directory {dir_path}: {e}")
+                finally:
+                    if batch:
+                        entry_queue.put(batch)
+                    dir_queue.task_done()
+
+        def wait_for_walkers():
+            # Every queued directory has been scanned once join() returns
+            dir_queue.join()
+            for _ in walkers:
+                dir_queue.put(None)
+            entry_queue.put(done)
+
+        dir_queue.put(root_path)
+        walkers = [
+            threading.Thread(target=scan_worker, daemon=True)
+            for _ in range(self.WALK_WORKERS)
+        ]
+        for walker in walkers:
+            walker.start()
+        threading.Thread(target=wait_for_walkers, daemon=True).start()
+
+        while True:
+            batch = entry_queue.get()
+            if batch is done:
+                break
+            yield from batch
+
+    def _load_known_files(self):
+        """Load modification time and size of indexed files whose result is still valid"""
         cursor = self.conn.cursor()
-        
+        # CAST bypasses the TIMESTAMP converter so values compare as stored strings
+        cursor.execute('''
+            SELECT file_path, CAST(modified_at AS TEXT), file_size,
+                   file_extension, processing_status
+            FROM files
+        ''')
+        # Failed files are retried, and files skipped for their extension are
+        # revisited once that extension becomes supported
+        return {
+            path: (modified_at, size)
+            for path, modified_at, size, ext, status in cursor
+            if status == 'processed' or (status == 'skipped' and ext not in self.supported_formats)
+        }
+
+    def _new_process_pool(self, workers):
+        """Create a pool of conversion worker processes"""
+        # Spawned rather than forked because the walker and hashing threads are live
+        return ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_converter)
+
+    def _worker_processes_available(self):
+        """Check that conversion worker processes can start"""
+        pool = self._new_process_pool(1)
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO files (
-                    file_path, file_name, file_extension, file_size,
-                    created_at, modified_at, indexed_at, checksum,
-                    markdown_content, processing_status, error_message
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                file_info['file_path'],
-                file_info['file_name'],
-                file_info['file_extension'],
-                file_info['file_size'],
-                file_info['created_at'],
-                file_info['modified_at'],
-                file_info['indexed_at'],
-                file_info['checksum'],
-                file_info.get('markdown_content'),
-                file_info['processing_status'],
-                file_info.get('error_message')
-            ))
-            
-            if file_info['processing_status'] == 'processed':
-                cursor.execute('''
-                    INSERT INTO processing_queue (file_id, status, created_at)
-                    VALUES ((SELECT id FROM files WHERE file_path = ?), 'pending', ?)
-                ''', (file_info['file_path'], dt.datetime.now()))
-            
-            self.conn.commit()
-            
+            # Spawned workers re-import the __main__ module. In a script without an
+            # if __name__ == '__main__' guard they die on startup, which shows up here
+            # as a broken pool (inside such a worker, submit() itself raises and the
+            # worker exits before touching the database).
+            return pool.submit(_converter_ready).result()
+        except BrokenProcessPool as e:
+            logging.warning(
+                f"Conversion worker processes could not start ({e}); converting files "
+                f"in-process instead. Scripts using FileIndexer should call it under "
+                f"if __name__ == '__main__':"
+            )
+            return False
+        finally:
+            pool.shutdown()
+
+    def _process_files(self, file_entries, use_processes=True):
+        """Hash and convert files in a pipeline, yielding results in input order"""
+        # Stage 1 (stat + checksum) and stage 2 (markdown conversion) run in
+        # separate pools, so file N+1 is hashed while file N is converted and
+        # the caller writes file N-1 to the database.
+        workers = os.cpu_count() or 1
+        max_pending = 2 * workers * self.PENDING_PER_WORKER
+        # MarkItDown parsing is pure Python, so conversion runs in worker processes
+        # when they can start, otherwise on a single thread of this process
+        if use_processes:
+            self._converter = self._new_process_pool(workers)
+        else:
+            self._converter = ThreadPoolExecutor(max_workers=1, initializer=_init_converter)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as hasher, \
+                    ThreadPoolExecutor(max_workers=1) as isolator:
+                # Bound the number of in-flight files so results never pile up in memory
+                pending = deque()
+                for file_path, file_entry in file_entries:
+                    hashed = hasher.submit(self._process_file, file_path, file_entry)
+                    pending.append(self._chain_conversion(hashed, isolator))
+                    if len(pending) >= max_pending:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+        finally:
+            self._converter.shutdown()
+            self._converter = None
+            if self._isolation_pool is not None:
+                self._isolation_pool.shutdown()
+                self._isolation_pool = None
+
+    def _submit_conversion(self, file_path):
+        """Queue a file for conversion, restarting the worker pool if a crash broke it"""
+        with self._converter_lock:
+            try:
+                return self._converter.submit(_convert, file_path)
+            except BrokenProcessPool:
+                logging.warning("A conversion worker crashed; restarting the worker pool")
+                self._converter.shutdown(wait=False)
+                self._converter = self._new_process_pool(os.cpu_count() or 1)
+                return self._converter.submit(_convert, file_path)
+
+    def _convert_isolated(self, file_path):
+        """Convert one file alone so that a worker crash is attributed to it"""
+        # Only called from the single isolation thread, so files run strictly one at a time
+        if self._isolation_pool is None:
+            self._isolation_pool = self._new_process_pool(1)
+        try:
+            return self._isolation_pool.submit(_convert, file_path).result()
+        except BrokenProcessPool as e:
+            self._isolation_pool.shutdown(wait=False)
+            self._isolation_pool = None
+            return 'failed', f"Conversion worker crashed: {e}"
+
+    def _chain_conversion(self, hashed, isolator):
+        """Return a future that also runs the conversion stage for supported files"""
+        result = Future()
+
+        def convert(file_info, attempt):
+            try:
+                if attempt < 2:
+                    converted = self._submit_conversion(file_info['file_path'])
+                else:
+                    converted = isolator.submit(self._convert_isolated, file_info['file_path'])
+            except Exception as e:
+                result.set_result(self._apply_conversion(file_info, ('failed', str(e))))
+                return
+            converted.add_done_callback(lambda f: on_converted(file_info, f, attempt))
+
+        def on_converted(file_info, converted, attempt):
+            try:
+                outcome = converted.result()
+            except BrokenProcessPool:
+                # A dying worker fails every file queued in its pool, not only its own.
+                # Retry once in the restarted pool, then alone to find the culprit.
+                convert(file_info, attempt + 1)
+                return
+            except Exception as e:
+                outcome = ('failed', str(e))
+            result.set_result(self._apply_conversion(file_info, outcome))
+
+        def on_hashed(hashed):
+            try:
+                file_info = hashed.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            if file_info and file_info.get('file_extension') in self.supported_formats:
+                convert(file_info, 0)
+            else:
+                result.set_result(file_info)
+
+        hashed.add_done_callback(on_hashed)
+        return result
+
+    def _save_to_db(self, file_info):
+        """Queue file information for the next batched database write"""
+        self._file_batch.append((
+            file_info['file_path'],
+            file_info['file_name'],
+            file_info['file_extension'],
+            file_info['file_size'],
+            file_info['created_at'],
+            file_info['modified_at'],
+            file_info['indexed_at'],
+            file_info['checksum'],
+            file_info['processing_status'],
+            file_info.get('error_message')
+        ))
+
+        if file_info.get('compressed_content') is not None:
+            self._content_batch.append((file_info['file_path'], file_info['compressed_content']))
+
+    def _flush_batches(self):
+        """Write all queued rows to the database in a single transaction"""
+        if not (self._file_batch or self._dir_batch):
+            return
+
+        try:
+            with self.conn:
+                cursor = self.conn.cursor()
+                cursor.executemany(self._INSERT_FILE_SQL, self._file_batch)
+                cursor.executemany(self._INSERT_CONTENT_SQL, self._content_batch)
+                cursor.executemany(self._INSERT_DIR_SQL, self._dir_batch)
+
         except Exception as e:
-            logging.error(f"Error saving to database: {e}")
-            self.conn.rollback()
+            # Keep the good rows: fall back to one transaction per row
+            logging.error(
+                f"Error saving batch of {len(self._file_batch)} files and "
+                f"{len(self._dir_batch)} directories to database: {e}; retrying row by row"
+            )
+            self._save_rows_individually()
 
-    def _process_directory(self, dir_path):
-        """Process directory information"""
-        cursor = self.conn.cursor()
+        finally:
+            self._file_batch.clear()
+            self._content_batch.clear()
+            self._dir_batch.clear()
+            self._indexed_at = dt.datetime.now().isoformat()
+
+    def _save_rows_individually(self):
+        """Write the queued rows one at a time, logging each row that fails"""
+        for sql, rows in ((self._INSERT_FILE_SQL, self._file_batch),
+                          (self._INSERT_CONTENT_SQL, self._content_batch),
+                          (self._INSERT_DIR_SQL, self._dir_batch)):
+            for row in rows:
+                try:
+                    with self.conn:
+                        self.conn.execute(sql, row)
+                except Exception as e:
+                    # The first column of every row is the file or directory path
+                    logging.error(f"Error saving {row[0]} to database: {e}")
+
+    def _process_directory(self, dir_path, dir_entry):
+        """Queue directory information (path and its os.DirEntry) for the next batched write"""
         
         try:
-            dir_stat = os.stat(dir_path)
-            dir_info = {
-                'dir_path': str(dir_path),
-                'dir_name': Path(dir_path).name,
-                'parent_dir_path': str(Path(dir_path).parent),
-                'depth': len(Path(dir_path).parts),
-                'created_at': dt.datetime.fromtimestamp(dir_stat.st_ctime),
-                'modified_at': dt.datetime.fromtimestamp(dir_stat.st_mtime),
-                'indexed_at': dt.datetime.now()
-            }
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO directories (
-                    dir_path, dir_name, parent_dir_path, depth,
-                    created_at, modified_at, indexed_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                dir_info['dir_path'],
-                dir_info['dir_name'],
-                dir_info['parent_dir_path'],
-                dir_info['depth'],
-                dir_info['created_at'],
-                dir_info['modified_at'],
-                dir_info['indexed_at']
+            dir_stat = dir_entry.stat()
+            # The walker yields normalised paths ('a/b', never './a/b' or 'a/b/'),
+            # for which this equals len(Path(dir_path).parts) without building a Path
+            depth = dir_path.count(os.sep) + 1
+            self._dir_batch.append((
+                dir_path,
+                dir_entry.name,
+                # Same value as str(Path(dir_path).parent): '.' for top-level directories
+                os.path.dirname(dir_path) or os.curdir,
+                depth,
+                dt.datetime.fromtimestamp(dir_stat.st_ctime).isoformat(),
+                dt.datetime.fromtimestamp(dir_stat.st_mtime).isoformat(),
+                self._indexed_at
             ))
             
-            self.conn.commit()
-            
         except Exception as e:
             logging.error(f"Error processing directory {dir_path}: {e}")
-            self.conn.rollback()
 
     def index_directory(self, root_path):
         """Recursively index all files in the given directory"""
@@ -190,8 +565,21 @@ class FileIndexer:
             logging.error(f"Error: Path {root_path} does not exist")
             return
 
-        # Get total file count for progress bar
-        total_files = sum(1 for _ in root_path.rglob('*') if _.is_file())
+        # Checked before any database work, see _worker_processes_available()
+        use_processes = self._worker_processes_available()
+
+        # Walk the tree once; directories are recorded, files are hashed in parallel
+        file_entries = []
+        dir_entries = []
+        # Path() already normalised the root; '.' becomes '' so stored paths
+        # match what Path.rglob produced ('a/x.txt', not './a/x.txt')
+        walk_root = '' if str(root_path) == os.curdir else str(root_path)
+        for path, entry in self._walk(walk_root):
+            if entry.is_dir(follow_symlinks=False):
+                dir_entries.append((path, entry))
+            elif entry.is_file():
+                file_entries.append((path, entry))
+        total_files = len(file_entries)
         
         logging.info(f"Starting indexing of {root_path}")
         logging.info(f"Total files found: {total_files}")
@@ -199,23 +587,47 @@ class FileIndexer:
         processed = 0
         skipped = 0
         failed = 0
+        unchanged = 0
+
+        self._known_files = self._load_known_files()
+        self._indexed_at = dt.datetime.now().isoformat()
+
+        # A first-time build only needs the final database to be consistent.
+        # Decided from the tables, not the skip cache, which leaves out failed rows.
+        initial_load = self._is_empty_database()
+        with self.bulk_mode() if initial_load else nullcontext():
+            # Hold the write lock for the whole ingest instead of per transaction
+            self.conn.execute('PRAGMA locking_mode=EXCLUSIVE')
+
+            try:
+                for dir_path, dir_entry in dir_entries:
+                    self._process_directory(dir_path, dir_entry)
+                    if len(self._dir_batch) >= self.BATCH_SIZE:
+                        self._flush_batches()
 
-        # Process all files with progress bar
-        with tqdm(total=total_files, desc="Indexing files") as pbar:
-            for path in root_path.rglob('*'):
-                if path.is_file():
-                    file_info = self._process_file(path)
-                    if file_info:
-                        self._save_to_db(file_info)
-                        if file_info['processing_status'] == 'processed':
-                            processed += 1
-                        elif file_info['processing_status'] == 'skipped':
-                            skipped += 1
-                        else:
-                            failed += 1
-                    pbar.update(1)
-                elif path.is_dir():
-                    self._process_directory(path)
+                # Process all files with progress bar
+                with tqdm(total=total_files, desc="Indexing files") as pbar:
+                    for file_info in self._process_files(file_entries, use_processes):
+                        if file_info and file_info['processing_status'] == 'unchanged':
+                            unchanged += 1
+                        elif file_info:
+                            self._save_to_db(file_info)
+                            if len(self._file_batch) >= self.BATCH_SIZE:
+                                self._flush_batches()
+                            if file_info['processing_status'] == 'processed':
+                                processed += 1
+                            elif file_info['processing_status'] == 'skipped':
+                                skipped += 1
+                            else:
+                                failed += 1
+                        pbar.update(1)
+
+                self._flush_batches()
+            finally:
+                self._known_files = {}
+                # Release the exclusive lock even on errors (takes effect on the next access)
+                self.conn.execute('PRAGMA locking_mode=NORMAL')
+                self.conn.execute('SELECT 1 FROM file_formats LIMIT 1').fetchall()
 
         logging.info("Indexing completed!")
         
@@ -224,12 +636,23 @@ class FileIndexer:
         logging.info(f"Total files indexed: {total_files}")
         logging.info(f"Successfully processed: {processed}")
         logging.info(f"Skipped files: {skipped}")
+        logging.info(f"Unchanged since last index: {unchanged}")
         logging.info(f"Failed to process: {failed}")
 
+    def get_markdown_content(self, file_path):
+        """Return the converted markdown of an indexed file, or None"""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT c.content FROM file_contents c
+            JOIN files f ON f.id = c.file_id
+            WHERE f.file_path = ?
+        ''', (file_path,))
+        row = cursor.fetchone()
+        return decompress_content(row[0]) if row else None
+
     def add_directory_documentation(self, dir_path, title, description, purpose, guidelines, created_by="system"):
         """Add or update documentation for a directory"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         
         try:
             # Get directory ID
@@ -272,22 +695,18 @@ class FileIndexer:
                 WHERE id = ?
             ''', (datetime.now(), dir_id))
             
-            conn.commit()
+            self.conn.commit()
             logging.info(f"Added documentation version {next_version} for directory: {dir_path}")
             return True
             
         except Exception as e:
             logging.error(f"Error adding directory documentation: {e}")
-            conn.rollback()
+            self.conn.rollback()
             return False
-            
-        finally:
-            conn.close()
 
     def add_directory_tags(self, dir_path, tags, created_by="system"):
         """Add tags to a directory"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         
         try:
             # Get directory ID
@@ -307,22 +726,18 @@ class FileIndexer:
                     ) VALUES (?, ?, ?, ?)
                 ''', (dir_id, tag, datetime.now(), created_by))
             
-            conn.commit()
+            self.conn.commit()
             logging.info(f"Added tags {tags} to directory: {dir_path}")
             return True
             
         except Exception as e:
             logging.error(f"Error adding directory tags: {e}")
-            conn.rollback()
+            self.conn.rollback()
             return False
-            
-        finally:
-            conn.close()
 
     def add_directory_relation(self, source_path, target_path, relation_type, description):
         """Add a relationship between two directories"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         
         try:
             cursor.execute('''
@@ -334,17 +749,14 @@ class FileIndexer:
                 WHERE d1.dir_path = ? AND d2.dir_path = ?
             ''', (relation_type, description, datetime.now(), source_path, target_path))
             
-            conn.commit()
+            self.conn.commit()
             logging.info(f"Added relation {relation_type} between {source_path} and {target_path}")
             return True
             
         except Exception as e:
             logging.error(f"Error adding directory relation: {e}")
-            conn.rollback()
+            self.conn.rollback()
             return False
-            
-        finally:
-            conn.close()
 
     def __del__(self):
         """デストラクタでデータベース接続を閉じる"""
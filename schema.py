@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import os
 import sqlite3
+import zlib
 from datetime import datetime
 import colorama
 from colorama import Fore, Style
@@ -41,6 +42,120 @@ def get_supported_formats():
         ('txt', 'text', 'Text Document')
     ]
 
+def create_file_contents_table(cursor):
+    """Create the table holding converted markdown, kept apart from files"""
+    # content is zlib-compressed UTF-8 markdown, see compress_content()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS file_contents (
+        file_id INTEGER PRIMARY KEY,
+        content BLOB,
+        FOREIGN KEY (file_id) REFERENCES files(id)
+    )
+    ''')
+
+def compress_content(text):
+    """Compress markdown text for storage in file_contents"""
+    return zlib.compress(text.encode('utf-8'))
+
+def decompress_content(blob):
+    """Restore markdown text stored in file_contents"""
+    return zlib.decompress(blob).decode('utf-8')
+
+def get_indices():
+    """Return (name, table, CREATE statement) tuples for all secondary indices"""
+    return [
+        ('idx_file_ext', 'files', 'CREATE INDEX IF NOT EXISTS idx_file_ext ON files(file_extension)'),
+        # Covering index: the incremental-skip preload never touches the table rows
+        ('idx_file_skip_cov', 'files', 'CREATE INDEX IF NOT EXISTS idx_file_skip_cov ON files(file_path, modified_at, file_size, file_extension, processing_status)'),
+        ('idx_dir_path', 'directories', 'CREATE INDEX IF NOT EXISTS idx_dir_path ON directories(dir_path)'),
+        ('idx_parent_dir', 'directories', 'CREATE INDEX IF NOT EXISTS idx_parent_dir ON directories(parent_dir_path)'),
+        ('idx_dir_docs', 'directory_docs', 'CREATE INDEX IF NOT EXISTS idx_dir_docs ON directory_docs(directory_id, version)'),
+        ('idx_dir_tags', 'directory_tags', 'CREATE INDEX IF NOT EXISTS idx_dir_tags ON directory_tags(directory_id)'),
+        ('idx_dir_relations', 'directory_relations', 'CREATE INDEX IF NOT EXISTS idx_dir_relations ON directory_relations(source_dir_id, target_dir_id)')
+    ]
+
+def get_obsolete_indices():
+    """Return names of indices created by older versions that are no longer used"""
+    return [
+        'idx_file_path',  # duplicates the UNIQUE autoindex on files.file_path
+        'idx_file_path_cov'  # replaced by idx_file_skip_cov
+    ]
+
+def create_indices(cursor):
+    """Create all secondary indices that do not exist yet"""
+    for _, _, sql in get_indices():
+        cursor.execute(sql)
+
+def drop_indices(cursor, tables):
+    """Drop the secondary indices defined on the given tables"""
+    for name, table, _ in get_indices():
+        if table in tables:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+
+def create_triggers(cursor):
+    """Create triggers that keep derived tables in sync with files"""
+    # Queue every successfully converted file without a second INSERT from Python
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_queue_processed_file
+    AFTER INSERT ON files
+    WHEN NEW.processing_status = 'processed'
+    BEGIN
+        INSERT INTO processing_queue (file_id, status, created_at)
+        VALUES (NEW.id, 'pending', NEW.indexed_at);
+    END
+    ''')
+    # Re-queue a file when its content changes after it was indexed
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_queue_updated_file
+    AFTER UPDATE OF checksum, processing_status ON files
+    WHEN NEW.processing_status = 'processed'
+        AND (OLD.checksum IS NOT NEW.checksum OR OLD.processing_status IS NOT 'processed')
+    BEGIN
+        INSERT INTO processing_queue (file_id, status, created_at)
+        VALUES (NEW.id, 'pending', NEW.indexed_at);
+    END
+    ''')
+    # Converted content is stale once a file is no longer processed
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_clear_file_contents
+    AFTER UPDATE OF processing_status ON files
+    WHEN NEW.processing_status IS NOT 'processed'
+    BEGIN
+        DELETE FROM file_contents WHERE file_id = OLD.id;
+    END
+    ''')
+    # Drop converted content together with its file row
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_delete_file_contents
+    AFTER DELETE ON files
+    BEGIN
+        DELETE FROM file_contents WHERE file_id = OLD.id;
+    END
+    ''')
+
+def migrate_markdown_content(cursor):
+    """Move markdown stored inline in files.markdown_content into file_contents"""
+    columns = {row[1] for row in cursor.execute('PRAGMA table_info(files)')}
+    if 'markdown_content' not in columns:
+        return
+    # A second cursor streams the old rows while the first one writes
+    reader = cursor.connection.cursor()
+    reader.execute('SELECT id, markdown_content FROM files WHERE markdown_content IS NOT NULL')
+    cursor.executemany('''
+    INSERT OR IGNORE INTO file_contents (file_id, content) VALUES (?, ?)
+    ''', ((file_id, compress_content(text)) for file_id, text in reader))
+    # The column is kept for older readers but no longer holds a second copy
+    cursor.execute('UPDATE files SET markdown_content = NULL WHERE markdown_content IS NOT NULL')
+
+def upgrade_database(cursor):
+    """Add tables, indices and triggers missing from databases created by older versions"""
+    create_file_contents_table(cursor)
+    migrate_markdown_content(cursor)
+    for name in get_obsolete_indices():
+        cursor.execute(f'DROP INDEX IF EXISTS {name}')
+    create_indices(cursor)
+    create_triggers(cursor)
+
 def init_database(db_path='file_index.db'):
     """Initialize SQLite database with all required tables"""
     print(f"\nInitializing database at: {os.path.abspath(db_path)}")
@@ -48,6 +163,9 @@ def init_database(db_path='file_index.db'):
     try:
         conn = sqlite3.connect(db_path)
         c = conn.cursor()
+
+        # Page size can only be changed before the first table is written
+        c.execute('PRAGMA page_size=8192')
         
         print("\nCreating tables...")
         
@@ -63,7 +181,6 @@ def init_database(db_path='file_index.db'):
             modified_at TIMESTAMP,
             indexed_at TIMESTAMP,
             checksum TEXT,
-            markdown_content TEXT,
             content_summary TEXT,
             processing_status TEXT,
             error_message TEXT,
@@ -170,17 +287,18 @@ def init_database(db_path='file_index.db'):
         ''')
         print_success("✓ Created processing_queue table")
 
+        create_file_contents_table(c)
+        print_success("✓ Created file_contents table")
+
         print("\nCreating indices...")
         # Create indices
-        c.execute('CREATE INDEX IF NOT EXISTS idx_file_path ON files(file_path)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_file_ext ON files(file_extension)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_dir_path ON directories(dir_path)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_parent_dir ON directories(parent_dir_path)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_dir_docs ON directory_docs(directory_id, version)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_dir_tags ON directory_tags(directory_id)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_dir_relations ON directory_relations(source_dir_id, target_dir_id)')
+        create_indices(c)
         print_success("✓ Created all indices")
 
+        print("\nCreating triggers...")
+        create_triggers(c)
+        print_success("✓ Created all triggers")
+
         print("\nInitializing supported formats...")
         # Insert supported formats
         formats = get_supported_formats()